@@ -0,0 +1,198 @@
+# CostRules class
+
+import unittest
+import string
+
+__all__ = ['CostRules', 'CompiledCostRules', 'PRODUCTION_RULES']
+
+class CostRules(object):
+    """CostRules describes how long a programmer takes to decode a wiretap:
+        - dict_letter_classes: name of letter class -> letters of the class.
+          Letters in no class only count for cost_per_letter.
+        - cost_per_letter: cost of every letter of the victim's name.
+        - dict_parity_costs: 'even' or 'odd' (parity of programmer number)
+          -> dict of letter class -> additional cost per letter of the class.
+        - shared_prime_penalty: additional cost per prime factor shared by
+          the programmer number and the length of the victim's name.
+
+       The rules are not evaluated per victim and programmer. compile()
+       turns them into lookup tables for a number of programmers, see
+       CompiledCostRules.
+    """
+
+    def __init__(self, dict_letter_classes, cost_per_letter,
+                 dict_parity_costs, shared_prime_penalty):
+        self.list_class_names = sorted(dict_letter_classes.keys())
+        self.dict_letter_classes = dict_letter_classes
+        self.cost_per_letter = cost_per_letter
+        self.dict_parity_costs = dict_parity_costs
+        self.shared_prime_penalty = shared_prime_penalty
+
+        # each letter is translated to the (one character) id of its class,
+        # so letters of a class can be counted by str.count
+        self.list_class_ids = [ chr(ord('A') + k)
+                                for k in range(0, len(self.list_class_names)) ]
+        letters_from, letters_to = "", ""
+        for k in range(0, len(self.list_class_names)):
+            letters = dict_letter_classes[self.list_class_names[k]]
+            letters_from += letters
+            letters_to += self.list_class_ids[k] * len(letters)
+        self.table_translate = string.maketrans(letters_from, letters_to)
+
+    def get_letter_counts(self, word):
+        """return the number of letters of each letter class in word, in the
+           order of list_class_names"""
+        translated = word.translate(self.table_translate)
+        return tuple([ translated.count(class_id)
+                       for class_id in self.list_class_ids ])
+
+    def get_parity_cost(self, parity, letter_counts):
+        """return the additional cost of programmers of the parity for a
+           name with the letter counts"""
+        cost = 0
+        dict_costs = self.dict_parity_costs.get(parity, {})
+        for k in range(0, len(self.list_class_names)):
+            if self.list_class_names[k] in dict_costs:
+                cost += dict_costs[self.list_class_names[k]] * letter_counts[k]
+        return cost
+
+    def compile(self, num_programmers):
+        """return the rules compiled for programmers 1 to num_programmers"""
+        return CompiledCostRules(self, num_programmers)
+
+
+
+class CompiledCostRules(object):
+    """CostRules compiled for a number of programmers. The cost depends on
+       the victim only through (length, letter counts) and on the programmer
+       only through (parity, prime factors), so a row of the cost table is
+       looked up by the victim key and built once:
+
+         row = cost_per_letter * length + parity row + prime penalty row
+
+       The parity row alternates the odd and even costs, and the prime
+       penalty row of a length adds shared_prime_penalty at each multiple
+       of each prime factor of the length. Victims with the same key share
+       the same row object, so rows must be copied before being modified.
+    """
+
+    def __init__(self, rules, num_programmers):
+        self.rules = rules
+        self.num_programmers = num_programmers
+        self.dict_penalty_rows = {}
+        self.dict_rows = {}
+
+    def _get_penalty_row(self, len_vname):
+        """return the prime penalty of each programmer for the length"""
+        if len_vname not in self.dict_penalty_rows:
+            row = [0] * self.num_programmers
+            for prime_num in self._get_prime_factors(len_vname):
+                for j in range(prime_num - 1, self.num_programmers, prime_num):
+                    row[j] += self.rules.shared_prime_penalty
+            self.dict_penalty_rows[len_vname] = row
+        return self.dict_penalty_rows[len_vname]
+
+    @staticmethod
+    def _get_prime_factors(num):
+        """return the distinct prime factors of num by trial division"""
+        list_factors = []
+        factor = 2
+        while factor * factor <= num:
+            if num % factor == 0:
+                list_factors.append(factor)
+                while num % factor == 0:
+                    num //= factor
+            factor += 1
+        if num > 1:
+            list_factors.append(num)
+        return list_factors
+
+    def get_row(self, vname):
+        """return the cost of each programmer for the victim"""
+        key = (len(vname), self.rules.get_letter_counts(vname))
+        if key not in self.dict_rows:
+            len_vname, letter_counts = key
+            base = self.rules.cost_per_letter * len_vname
+            cost_odd = self.rules.get_parity_cost('odd', letter_counts) + base
+            cost_even = self.rules.get_parity_cost('even', letter_counts) + base
+            row_parity = [cost_odd, cost_even] * \
+                         ( (self.num_programmers + 1) // 2 )
+            self.dict_rows[key] = \
+                [ cost + penalty for cost, penalty in
+                  zip(row_parity, self._get_penalty_row(len_vname)) ]
+        return self.dict_rows[key]
+
+    def build_cost_table(self, list_victim_names):
+        """return cost table with one row per victim and one column per
+           programmer"""
+        return [ self.get_row(vname) for vname in list_victim_names ]
+
+
+
+PRODUCTION_RULES = CostRules(
+    { 'vowel': 'aeiou', 'consonant': 'bcdfghjklmnpqrstvwxyz' },
+    1,
+    { 'even': { 'vowel': 1.5 }, 'odd': { 'consonant': 1 } },
+    2)
+
+
+
+# this part is for unit testing of CostRules class
+class TestCostRules (unittest.TestCase):
+    """Test CostRules and CompiledCostRules classes."""
+
+    def setUp(self):
+        self.compiled = PRODUCTION_RULES.compile(60)
+
+    def test_01_get_letter_counts(self):
+        """test get_letter_counts function."""
+
+        result = PRODUCTION_RULES.get_letter_counts("chair")
+        self.failUnless (result == (3, 2),
+                         'get_letter_counts("chair") fail. result = %s'
+                         % (result,) )
+
+    def test_02_build_cost_table(self):
+        """compare build_cost_table with the rules evaluated per cell."""
+
+        list_vnames = ['john', 'kelly', 'norman', 'bob', 'john', 'zenobia',
+                       'b' * 49, 'b' * 53, 'ab' * 30]
+        result = self.compiled.build_cost_table(list_vnames)
+
+        list_primes = [ x for x in range(2, 61)
+                        if all([ x % y != 0 for y in range(2, x) ]) ]
+        expected = []
+        for vname in list_vnames:
+            num_cons, num_vow = PRODUCTION_RULES.get_letter_counts(vname)
+            row = []
+            for id_prog in range(1, 61):
+                if id_prog % 2 == 0:
+                    weight = 1.5 * num_vow
+                else:
+                    weight = num_cons
+                num_shared = len([ x for x in list_primes
+                                   if id_prog % x == 0 and len(vname) % x == 0 ])
+                weight += len(vname) + 2 * num_shared
+                row.append(weight)
+            expected.append(row)
+
+        self.failUnless (result == expected,
+                         "build_cost_table(%s) fail. result = %s"
+                         % (list_vnames, result) )
+        self.failUnless (result[0] is result[4],
+                         "rows of the same key not shared")
+
+    def test_03_custom_rules(self):
+        """test rules other than the production rules."""
+
+        rules = CostRules({ 'x': 'x' }, 0, { 'odd': { 'x': 10 } }, 1)
+        result = rules.compile(4).build_cost_table(['xax', 'ab'])
+        self.failUnless (result == [[20, 0, 21, 0], [0, 1, 0, 1]],
+                         "build_cost_table(['xax', 'ab']) fail. result = %s"
+                         % (result) )
+
+    def tearDown(self):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,42 +2,232 @@
 
 import sys
 import getopt
+import socket
 from wiretaps import Wiretaps
+from online_wiretaps import OnlineWiretaps
+from result_writer import FORMATS
 
 __all__ = []
 
+def get_name_from_line(line):
+    """return the victim name in the line: lower case letters only"""
+    return "".join([letter for letter in line.lower() if letter.isalpha()])
+
+
 def get_names_from_file(file_name):
     list_victim_names = []
     infile = file(file_name, "r")
 
     for line in infile.readlines():
-        line = line.lower()
-        new_line = ""
-        for letter in line:
-            if letter.isalpha():
-                new_line += letter
-
+        new_line = get_name_from_line(line)
         if len(new_line) > 0: 
             list_victim_names.append(new_line)
     return list_victim_names
 
     
+def get_forbidden_pair(arg):
+    """parse NAME:PROGRAMMER into (name, programmer number). Raises
+       ValueError if arg is malformed."""
+    if ":" not in arg:
+        raise ValueError("no programmer in forbidden pair %s" % arg)
+    vname, id_prog = arg.rsplit(":", 1)
+    if int(id_prog) < 1:
+        raise ValueError("unknown programmer in forbidden pair %s" % arg)
+    return (get_name_from_line(vname), int(id_prog))
+
+
+def run_online(num_programmers, num_augmentations, every_arrivals,
+               listen_address, outfile, list_forbidden_pairs):
+    """assign victims as they arrive on stdin, or on the first connection
+       to listen_address (HOST:PORT) if given, and write the assignments to
+       outfile"""
+    if num_programmers == None:
+        print("--programmers is required in online mode.")
+        sys.exit(2)
+    for vname, id_prog in list_forbidden_pairs:
+        if id_prog > num_programmers:
+            print("--forbid %s:%d: there are only %d programmers."
+                  % (vname, id_prog, num_programmers))
+            sys.exit(2)
+    if listen_address != None and \
+       (":" not in listen_address or
+        not listen_address.rsplit(":", 1)[1].isdigit()):
+        print("--listen must be HOST:PORT.")
+        sys.exit(2)
+
+    online = OnlineWiretaps(num_programmers, num_augmentations,
+                            every_arrivals,
+                            list_forbidden_pairs = list_forbidden_pairs)
+    try:
+        if listen_address == None:
+            online.run(sys.stdin, outfile, get_name_from_line)
+            return
+
+        host, port = listen_address.rsplit(":", 1)
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, int(port)))
+        server.listen(1)
+        conn, addr = server.accept()
+        infile = conn.makefile("r")
+        online.run(infile, outfile, get_name_from_line)
+        infile.close()
+        conn.close()
+        server.close()
+    except ValueError, e:
+        # e.g. more victims than programmers, or the forbidden pairs leave
+        # some victim no programmer
+        outfile.flush()
+        print("No assignment found: %s." % e)
+        sys.exit(2)
+
+    
 if __name__ == '__main__':
     cmdline_params = sys.argv[1:]
-    opts, args = getopt.gnu_getopt(cmdline_params, '', [])
+    opts, args = getopt.gnu_getopt(cmdline_params, '',
+                                   ['programmers=', 'forbid=', 'k-best=',
+                                    'sensitivity', 'checkpoint=',
+                                    'checkpoint-every=',
+                                    'checkpoint-seconds=', 'resume=',
+                                    'output=', 'format=', 'online',
+                                    'listen=', 'augmentations=', 'every='])
 
-    if len(args) != 1:
+    if ('--online', '') in opts or '--listen' in dict(opts):
+        if len(args) != 0:
+            print("The following command not supported: \n\t%s" % sys.argv)
+            print("In online mode the victims are read from stdin or "
+                  "--listen, not from a file.")
+            sys.exit(2)
+    elif len(args) != 1:
         print("The following command not supported: \n\t%s" % sys.argv)
         print("The name of input file unknown.")
+        sys.exit(2)
+
+    num_programmers = None
+    list_forbidden_pairs = []
+    k_best = None
+    flag_sensitivity = False
+    checkpoint_file_name = None
+    checkpoint_num_augmentations = None
+    checkpoint_num_seconds = None
+    resume_file_name = None
+    output_file_name = None
+    output_format = 'text'
+    flag_online = False
+    listen_address = None
+    num_augmentations = 1
+    every_arrivals = 1
+    for opt, val in opts:
+        if opt == '--programmers':
+            num_programmers = int(val)
+        elif opt == '--forbid':
+            try:
+                list_forbidden_pairs.append(get_forbidden_pair(val))
+            except ValueError:
+                print("--forbid must be NAME:PROGRAMMER with a programmer "
+                      "number from 1.")
+                sys.exit(2)
+        elif opt == '--k-best':
+            k_best = int(val)
+            if k_best < 1:
+                print("--k-best must be at least 1.")
+                sys.exit(2)
+        elif opt == '--sensitivity':
+            flag_sensitivity = True
+        elif opt == '--checkpoint':
+            checkpoint_file_name = val
+        elif opt == '--checkpoint-every':
+            checkpoint_num_augmentations = int(val)
+        elif opt == '--checkpoint-seconds':
+            checkpoint_num_seconds = float(val)
+        elif opt == '--resume':
+            resume_file_name = val
+        elif opt == '--output':
+            output_file_name = val
+        elif opt == '--format':
+            output_format = val
+            if output_format not in FORMATS:
+                print("--format must be one of %s." % ", ".join(FORMATS))
+                sys.exit(2)
+        elif opt == '--online':
+            flag_online = True
+        elif opt == '--listen':
+            flag_online = True
+            listen_address = val
+        elif opt == '--augmentations':
+            num_augmentations = int(val)
+            if num_augmentations < 0:
+                print("--augmentations must be at least 0.")
+                sys.exit(2)
+        elif opt == '--every':
+            every_arrivals = int(val)
+            if every_arrivals < 1:
+                print("--every must be at least 1.")
+                sys.exit(2)
+
+    # the k best solutions, the sensitivity report and the online
+    # assignments are only written as text
+    if output_format != 'text' and \
+       (k_best != None or flag_sensitivity or flag_online):
+        print("--k-best, --sensitivity and --online only support "
+              "--format text.")
+        sys.exit(2)
+    if output_file_name == None:
+        outfile = sys.stdout
+    else:
+        outfile = open(output_file_name, "wb")
+
+    if flag_online:
+        run_online(num_programmers, num_augmentations, every_arrivals,
+                   listen_address, outfile, list_forbidden_pairs)
+        outfile.close()
+        sys.exit(0)
+
+    # keep saving to the checkpoint which the solve resumes from
+    if checkpoint_file_name == None:
+        checkpoint_file_name = resume_file_name
 
     input_file_name = args[0]
     list_vname = get_names_from_file(input_file_name)
     #print(list_vname)
     
-    wire_prob = Wiretaps()
-    wire_prob.solve_problem(list_vname)
+    if num_programmers == None:
+        num_programmers = len(list_vname)
+    if len(list_vname) > num_programmers:
+        print("--programmers must be at least the number of victims (%d)."
+              % len(list_vname))
+        sys.exit(2)
+    for vname, id_prog in list_forbidden_pairs:
+        if id_prog > num_programmers:
+            print("--forbid %s:%d: there are only %d programmers."
+                  % (vname, id_prog, num_programmers))
+            sys.exit(2)
+
+    wire_prob = Wiretaps(num_programmers)
+
+    try:
+        if k_best != None:
+            wire_prob.solve_k_best(list_vname, k_best, list_forbidden_pairs)
+            wire_prob.write_k_best(outfile)
+            outfile.close()
+            sys.exit(0)
+
+        if checkpoint_file_name != None:
+            wire_prob.set_checkpoint(checkpoint_file_name,
+                                     checkpoint_num_augmentations,
+                                     checkpoint_num_seconds)
+        wire_prob.solve_problem(list_vname, list_forbidden_pairs,
+                                resume_file_name)
+    except ValueError, e:
+        # e.g. the forbidden pairs leave some victim no programmer
+        print("No assignment found: %s." % e)
+        sys.exit(2)
     #wire_prob.print_cost_table()
-    wire_prob.print_solution()
+    wire_prob.write_solution(outfile, output_format)
+    if flag_sensitivity:
+        outfile.write("\n")
+        wire_prob.write_sensitivity(outfile)
+    outfile.close()
 
     
 
@@ -3,11 +3,21 @@
 # TODO: implement and use fibonacci heap instead of min heap. 
 import unittest
 import sys
+import os
+import struct
+import hashlib
+import tempfile
+from time import time
+from array import array
+from random import Random
+from itertools import permutations
 from heapq import heappush, heappop, heapify
 from heap_node import HeapNode
 
 __all__ = ['MinWeightBipartiteMatch', 'find_match']
 
+CHECKPOINT_MAGIC = "MWBMCKP1"
+
 class MinWeightBipartiteMatch(object):
     """This is an implementation of Minimum Weight Bipartite Matching
        using augument path and dijkstra's shortest path.
@@ -16,23 +26,659 @@ class MinWeightBipartiteMatch(object):
 
        http://valis.cs.uiuc.edu/~sariel/teach/courses/473/notes/27_matchings_notes.pdf
 
-       Python version uses built-in (min) heap. For improvement, fibonacci heap
-       can be use.
+       The weight table has m rows (left category) and n columns (right
+       category) with m <= n, so every left node is matched and n - m right
+       nodes stay exposed. A None entry in the table is a forbidden pair,
+       i.e. the edge does not exist in the graph.
+
+       find_match() keeps dual potentials for both categories so that the
+       reduced weights are non-negative, and grows each augumenting path with
+       a dense dijkstra (no heap needed), which costs O(m^2 n) in total.
+       _find_min_augument_path() is the original heap based version working
+       on raw weights.
     """
 
-    def __init__(self, arg_weight_table):
-        assert len(arg_weight_table) == len(arg_weight_table[0]), \
-               "weight table is not square"
+    def __init__(self, arg_weight_table, arg_num_right = None):
+        """arg_num_right is the number of right nodes, only needed if the
+           weight table has no rows yet (see add_left_node())."""
+        assert len(arg_weight_table) > 0 or arg_num_right != None, \
+               "number of right nodes unknown"
 
         self.table_weight = arg_weight_table
-        self.map_match_left_to_right = [None] * len(self.table_weight)
-        self.map_match_right_to_left = [None] * len(self.table_weight)
+        self.num_left = len(self.table_weight)
+        self.num_right = ( len(self.table_weight[0]) if self.num_left > 0
+                           else arg_num_right )
+        assert self.num_left <= self.num_right, \
+               "weight table has more rows than columns"
+        self.map_match_left_to_right = [None] * self.num_left
+        self.map_match_right_to_left = [None] * self.num_right
         self.list_all_node_ids_right_category = \
-            range( len(self.table_weight), 2 * len(self.table_weight) )
+            range( self.num_left, self.num_left + self.num_right )
+        self.potential_left = None
+        self.potential_right = None
         self.solution = None
+        self.table_hash = None
+        self.checkpoint_file_name = None
+        self.checkpoint_num_augmentations = None
+        self.checkpoint_num_seconds = None
 
     def find_match(self):
-        """find minimum match given weight table"""
+        """find minimum match given weight table. Raises ValueError if some
+           left node cannot be matched because of forbidden pairs."""
+
+        if self.potential_left == None:
+            self._init_potentials()
+
+        num_augmented = 0
+        time_saved = time()
+        for i in range(0, self.num_left):
+            if self.map_match_left_to_right[i] == None:
+                self._augment_with_potentials(i)
+                num_augmented += 1
+
+                if self.checkpoint_file_name != None and \
+                   self._is_checkpoint_due(num_augmented, time_saved):
+                    self.save_checkpoint(self.checkpoint_file_name)
+                    num_augmented = 0
+                    time_saved = time()
+
+        self.solution = [ self._local_node_id(x) for x in
+                                 self.map_match_left_to_right ]
+        return self.solution
+
+
+    def add_left_node(self, row):
+        """add a left node with the weights in row (None for forbidden pairs)
+           to the weight table, which is modified, and return its local id.
+           The node stays exposed until find_match() or match_left_node().
+           Global ids of right nodes shift by one, so this takes O(m + n).
+        """
+        assert len(row) == self.num_right, "row does not fit weight table"
+        assert self.num_left < self.num_right, \
+               "weight table has more rows than columns"
+
+        if self.potential_left != None:
+            list_allowed = [ row[j] - self.potential_right[j]
+                             for j in range(0, self.num_right)
+                             if row[j] != None ]
+            if len(list_allowed) == 0:
+                raise ValueError("left node %d has no allowed pair"
+                                 % self.num_left)
+            self.potential_left.append(min(list_allowed))
+
+        self.map_match_left_to_right = \
+            [ (x + 1 if x != None else None)
+              for x in self.map_match_left_to_right ] + [None]
+        self.table_weight.append(row)
+        self.num_left += 1
+        self.list_all_node_ids_right_category = \
+            range( self.num_left, self.num_left + self.num_right )
+        self.table_hash = None
+        self.solution = None
+        return self.num_left - 1
+
+
+    def remove_last_left_node(self):
+        """remove the last left node, which must be exposed, from the weight
+           table; this undoes add_left_node(). O(m + n)."""
+        assert self.num_left > 0 and \
+               self.map_match_left_to_right[-1] == None, \
+               "last left node is matched"
+
+        self.map_match_left_to_right = \
+            [ (x - 1 if x != None else None)
+              for x in self.map_match_left_to_right[:-1] ]
+        self.table_weight.pop()
+        self.num_left -= 1
+        self.list_all_node_ids_right_category = \
+            range( self.num_left, self.num_left + self.num_right )
+        self.table_hash = None
+        self.solution = None
+        if self.potential_left != None:
+            self.potential_left.pop()
+
+
+    def match_left_node(self, id_left):
+        """match the exposed left node id_left along a shortest augumenting
+           path, which keeps the match minimum among the matched left nodes.
+           The match of other left nodes may change. O(mn)."""
+        assert self.map_match_left_to_right[id_left] == None, \
+               "left node %d already matched" % id_left
+
+        if self.potential_left == None:
+            self._init_potentials()
+        self._augment_with_potentials(id_left)
+        self.solution = None
+
+
+    def get_match(self):
+        """return the local id of the matched right node (None if exposed)
+           of each left node"""
+        return [ (self._local_node_id(x) if x != None else None)
+                 for x in self.map_match_left_to_right ]
+
+
+    def set_checkpoint(self, file_name, num_augmentations = None,
+                       num_seconds = None):
+        """make find_match() save its state to file_name every
+           num_augmentations augumentations and/or every num_seconds seconds
+           (every 60 seconds if neither is given). A saved state costs
+           O(m + n) while an augumentation costs O(mn), so saving is cheap.
+        """
+        if num_augmentations == None and num_seconds == None:
+            num_seconds = 60
+        self.checkpoint_file_name = file_name
+        self.checkpoint_num_augmentations = num_augmentations
+        self.checkpoint_num_seconds = num_seconds
+
+
+    def _is_checkpoint_due(self, num_augmented, time_saved):
+        """return true if the state should be saved"""
+        if self.checkpoint_num_augmentations != None and \
+           num_augmented >= self.checkpoint_num_augmentations:
+            return True
+        return self.checkpoint_num_seconds != None and \
+               time() - time_saved >= self.checkpoint_num_seconds
+
+
+    def get_table_hash(self):
+        """return sha1 digest of the weight table, used to check that a
+           checkpoint belongs to the table. Each row is hashed as the bytes
+           of an array of doubles (None as NaN) rather than as repr(row),
+           which formatted every weight and took up to a third of a solve
+           on float tables."""
+        if self.table_hash == None:
+            nan = float('nan')
+            sha = hashlib.sha1()
+            sha.update(struct.pack('<ii', self.num_left, self.num_right))
+            for row in self.table_weight:
+                if None in row:
+                    row = [ (nan if x == None else x) for x in row ]
+                sha.update(array('d', row).tostring())
+            self.table_hash = sha.digest()
+        return self.table_hash
+
+
+    def save_checkpoint(self, file_name):
+        """save the match and the potentials to file_name. The file holds
+           a header (magic, table hash, m, n) followed by the match as int32
+           (-1 for exposed) and the potentials as doubles. It is written to a
+           temporary file first and renamed, so a crash keeps the previous
+           checkpoint intact. Where rename does not replace an existing file
+           (Windows), the previous checkpoint is removed first; a crash
+           between the two leaves the complete new state in the temporary
+           file, which load_checkpoint() reads when file_name is missing."""
+        assert self.potential_left != None, "nothing to save yet."
+
+        list_match = [ (self._local_node_id(x) if x != None else -1)
+                       for x in self.map_match_left_to_right ]
+        file_name_tmp = file_name + ".tmp"
+        outfile = open(file_name_tmp, "wb")
+        outfile.write(CHECKPOINT_MAGIC)
+        outfile.write(self.get_table_hash())
+        outfile.write(struct.pack('<ii', self.num_left, self.num_right))
+        array('i', list_match).tofile(outfile)
+        array('d', self.potential_left).tofile(outfile)
+        array('d', self.potential_right).tofile(outfile)
+        outfile.close()
+        try:
+            os.rename(file_name_tmp, file_name)
+        except OSError:
+            os.remove(file_name)
+            os.rename(file_name_tmp, file_name)
+
+
+    def load_checkpoint(self, file_name):
+        """warm start find_match() from a checkpoint saved by
+           save_checkpoint(). Raises ValueError if the checkpoint was saved
+           for another weight table, or is truncated or corrupted: the match
+           must use edges of the table and be tight, and the potentials must
+           be feasible, which is checked in O(mn)."""
+
+        # save_checkpoint() was interrupted between removing the previous
+        # checkpoint and renaming the new one
+        if not os.path.exists(file_name) and \
+           os.path.exists(file_name + ".tmp"):
+            file_name = file_name + ".tmp"
+
+        infile = open(file_name, "rb")
+        try:
+            if infile.read(len(CHECKPOINT_MAGIC)) != CHECKPOINT_MAGIC:
+                raise ValueError("%s is not a checkpoint" % file_name)
+            if infile.read(len(self.get_table_hash())) != \
+               self.get_table_hash():
+                raise ValueError("checkpoint %s is for another weight table"
+                                 % file_name)
+            num_left, num_right = struct.unpack('<ii', infile.read(8))
+            if num_left != self.num_left or num_right != self.num_right:
+                raise ValueError("checkpoint %s is corrupted" % file_name)
+            list_match = array('i')
+            list_match.fromfile(infile, num_left)
+            list_potential_left = array('d')
+            list_potential_left.fromfile(infile, num_left)
+            list_potential_right = array('d')
+            list_potential_right.fromfile(infile, num_right)
+        except (EOFError, struct.error):
+            raise ValueError("checkpoint %s is corrupted" % file_name)
+        finally:
+            infile.close()
+
+        list_matched = [ x for x in list_match if x >= 0 ]
+        if len(set(list_matched)) != len(list_matched) or \
+           max(list_matched + [-1]) >= num_right or \
+           not self._is_state_feasible(list_match, list_potential_left,
+                                       list_potential_right):
+            raise ValueError("checkpoint %s is corrupted" % file_name)
+
+        self.set_initial_state([ (x if x >= 0 else None) for x in list_match ],
+                               list_potential_left.tolist(),
+                               list_potential_right.tolist())
+
+
+    def _is_state_feasible(self, list_match, list_potential_left,
+                           list_potential_right):
+        """return true if no reduced weight is negative and every matched
+           edge is in the table and tight, up to rounding. O(mn)."""
+        for i in range(0, self.num_left):
+            row = self.table_weight[i]
+            pot = list_potential_left[i]
+            for j in range(0, self.num_right):
+                if row[j] != None and \
+                   row[j] - pot - list_potential_right[j] < \
+                   -1e-9 * max(1.0, abs(row[j])):
+                    return False
+            j = list_match[i]
+            if j >= 0 and (row[j] == None or
+                           abs(row[j] - pot - list_potential_right[j]) >
+                           1e-9 * max(1.0, abs(row[j]))):
+                return False
+        return True
+
+
+    def set_initial_state(self, list_match, list_potential_left,
+                          list_potential_right):
+        """warm start find_match() from the state of a previous solve.
+           list_match has the local id of the matched right node (or None)
+           for each left node. The potentials must be feasible for the
+           table and every matched edge must be tight, e.g. the state of a
+           solve on a table with some edges removed since. Right nodes exposed
+           since are released by _release_right_node(). find_match() then
+           only augments the exposed left nodes.
+        """
+        assert len(list_match) == self.num_left and \
+               len(list_potential_left) == self.num_left and \
+               len(list_potential_right) == self.num_right, \
+               "initial state does not fit weight table"
+
+        self.potential_left = list(list_potential_left)
+        self.potential_right = list(list_potential_right)
+        self.map_match_left_to_right = [None] * self.num_left
+        self.map_match_right_to_left = [None] * self.num_right
+        for i in range(0, self.num_left):
+            if list_match[i] != None:
+                self.map_match_left_to_right[i] = \
+                    self._global_node_id(list_match[i], False)
+                self.map_match_right_to_left[list_match[i]] = i
+
+        for j in range(0, self.num_right):
+            if self.map_match_right_to_left[j] == None and \
+               self.potential_right[j] < 0:
+                self._release_right_node(j)
+
+
+    def get_potentials(self):
+        """return the dual potentials (potential_left, potential_right) of
+           the match. w - potential_left - potential_right is the reduced
+           weight of an edge; it is 0 for matched edges and non-negative
+           otherwise."""
+        assert self.solution != None, "find_match() not called yet."
+        return (self.potential_left, self.potential_right)
+
+
+    def get_sensitivity(self):
+        """return (increase, id_right_alt, reduced_weight_alt) for each left
+           node, computed from the potentials in O(mn) without solving again.
+
+           Both values are lower bounds. The match stays minimum when the
+           weight of the matched edge drops by any amount or grows by up to
+           increase (it may stay minimum beyond): any other match has to
+           take the left node along another edge, and has to give the right
+           node to another left node or expose it, and increase is the sum
+           of the smallest reduced weights of doing so. id_right_alt is the
+           other right node with the smallest reduced weight for the left
+           node (None if there is none), and matching the left node there
+           costs at least reduced_weight_alt more.
+        """
+        assert self.solution != None, "find_match() not called yet."
+
+        pot_right = self.potential_right
+        inf = float('inf')
+
+        # the two smallest reduced weights of each right node
+        list_min_right = [inf] * self.num_right
+        list_id_min_right = [None] * self.num_right
+        list_second_min_right = [inf] * self.num_right
+        list_alt = []
+        for i in range(0, self.num_left):
+            row = self.table_weight[i]
+            pot = self.potential_left[i]
+            id_alt, weight_alt = None, inf
+            for j in range(0, self.num_right):
+                if row[j] == None:
+                    continue
+                reduced_weight = row[j] - pot - pot_right[j]
+                if j != self.solution[i] and reduced_weight < weight_alt:
+                    id_alt, weight_alt = j, reduced_weight
+                if reduced_weight < list_min_right[j]:
+                    list_second_min_right[j] = list_min_right[j]
+                    list_min_right[j] = reduced_weight
+                    list_id_min_right[j] = i
+                elif reduced_weight < list_second_min_right[j]:
+                    list_second_min_right[j] = reduced_weight
+            list_alt.append( (id_alt, weight_alt) )
+
+        list_sensitivity = []
+        for i in range(0, self.num_left):
+            j = self.solution[i]
+            if list_id_min_right[j] == i:
+                weight_other_left = list_second_min_right[j]
+            else:
+                weight_other_left = list_min_right[j]
+            id_alt, weight_alt = list_alt[i]
+            increase = weight_alt + min(weight_other_left, -pot_right[j])
+            list_sensitivity.append( (increase, id_alt, weight_alt) )
+        return list_sensitivity
+
+
+    def find_k_best_match(self, k):
+        """return the k best matches as a list of (total weight, match) in
+           increasing order of total weight, using Murty's partitioning.
+           Popping a match of the queue partitions the rest of its subproblem
+           into subproblems which ban one of its edges and keep the edges of
+           the previous left nodes.
+
+           A subproblem is not solved when it is created. It is pushed with
+           a lower bound of its weight from the popped match and potentials
+           (see _get_ban_lower_bound()), and only solved when the bound
+           reaches the top of the queue. Then it is warm started from the
+           popped match and potentials, so it needs one augumentation, and is
+           pushed again with its match. Most subproblems are never solved.
+        """
+        assert k >= 1, "k must be at least 1"
+
+        heap = []
+        solution = self.find_match()
+        heappush( heap, (self._get_total_weight(self.table_weight, solution),
+                         False, 0, self.table_weight, solution,
+                         self.potential_left, self.potential_right, 0) )
+        num_pushed = 1
+
+        list_k_best = []
+        while heap and len(list_k_best) < k:
+            total_weight, flag_bound, id_entry, table, solution, pot_left, \
+                pot_right, num_kept = heappop(heap)
+
+            if flag_bound:
+                # solution is the parent match, whose edge of left node
+                # num_kept is banned in table
+                list_match = list(solution)
+                list_match[num_kept] = None
+                mwbm = MinWeightBipartiteMatch(table)
+                mwbm.set_initial_state(list_match, pot_left, pot_right)
+                try:
+                    solution_child = mwbm.find_match()
+                except ValueError:
+                    continue
+                heappush( heap,
+                          (self._get_total_weight(table, solution_child),
+                           False, num_pushed, table, solution_child,
+                           mwbm.potential_left, mwbm.potential_right,
+                           num_kept) )
+                num_pushed += 1
+                continue
+
+            list_k_best.append( (total_weight, solution) )
+
+            table_kept = list(table)
+            for i in range(num_kept, self.num_left):
+                row_banned = list(table_kept[i])
+                row_banned[solution[i]] = None
+                table_child = list(table_kept)
+                table_child[i] = row_banned
+
+                bound = self._get_ban_lower_bound(table_child, solution,
+                                                  pot_left, pot_right, i)
+                if bound != float('inf'):
+                    heappush( heap,
+                              (total_weight + bound, True, num_pushed,
+                               table_child, solution, pot_left, pot_right,
+                               i) )
+                    num_pushed += 1
+
+                # the next subproblems keep the edge of this left node
+                row_kept = [None] * self.num_right
+                row_kept[solution[i]] = table[i][solution[i]]
+                table_kept[i] = row_kept
+
+        return list_k_best
+
+
+    def _get_ban_lower_bound(self, table, solution, pot_left, pot_right,
+                             id_left):
+        """return a lower bound of how much more than the match solution
+           a match of table weighs, where table bans the edge of solution
+           at left node id_left and potentials are those of solution. Such a
+           match takes id_left along another edge, and gives the right node
+           to another left node or exposes it, so the bound is the sum of
+           the smallest reduced weights of doing so (inf if id_left has no
+           other edge). O(m + n).
+        """
+        inf = float('inf')
+        id_right = solution[id_left]
+
+        row = table[id_left]
+        pot = pot_left[id_left]
+        weight_left = inf
+        for j in range(0, self.num_right):
+            if row[j] != None and row[j] - pot - pot_right[j] < weight_left:
+                weight_left = row[j] - pot - pot_right[j]
+
+        weight_right = -pot_right[id_right]
+        for i in range(0, self.num_left):
+            weight = table[i][id_right]
+            if i != id_left and weight != None and \
+               weight - pot_left[i] - pot_right[id_right] < weight_right:
+                weight_right = weight - pot_left[i] - pot_right[id_right]
+        return weight_left + weight_right
+
+
+    @staticmethod
+    def _get_total_weight(table, solution):
+        """return total weight of the match in the table"""
+        return sum([ table[i][solution[i]] for i in range(0, len(solution)) ])
+
+
+    def _init_potentials(self):
+        """set up feasible dual potentials: each left node gets the minimum
+           weight of its row and each right node gets 0. A matching found
+           without potentials cannot be trusted, so the matching is cleared.
+        """
+        self.potential_left = []
+        for i in range(0, self.num_left):
+            list_allowed = [w for w in self.table_weight[i] if w != None]
+            if len(list_allowed) == 0:
+                raise ValueError("left node %d has no allowed pair" % i)
+            self.potential_left.append(min(list_allowed))
+        self.potential_right = [0] * self.num_right
+        self.map_match_left_to_right = [None] * self.num_left
+        self.map_match_right_to_left = [None] * self.num_right
+
+
+    def _augment_with_potentials(self, id_left_root):
+        """match the exposed left node id_left_root along a shortest
+           augumenting path. Reduced weights w - potential_left -
+           potential_right are non-negative, so dijkstra is used; with a dense
+           table picking the closest right node by a linear scan is O(n), and
+           at most m right nodes are scanned, so one call is O(mn).
+
+           Exposed right nodes have non-negative potentials (0 unless the
+           state was warm started), and ending the path at an exposed right
+           node costs its distance plus its potential.
+        """
+        table = self.table_weight
+        pot_left = self.potential_left
+        pot_right = self.potential_right
+        match_right = self.map_match_right_to_left
+        inf = float('inf')
+
+        dist = [inf] * self.num_right
+        prev_left = [id_left_root] * self.num_right
+        list_unscanned = range(0, self.num_right)
+        list_scanned = []
+        id_sink, dist_sink = None, inf
+
+        id_left = id_left_root
+        dist_left = 0
+        while True:
+            if id_left != None:
+                row = table[id_left]
+                pot = pot_left[id_left]
+                for j in list_unscanned:
+                    if row[j] == None:
+                        continue
+                    alt = dist_left + row[j] - pot - pot_right[j]
+                    if alt < dist[j]:
+                        dist[j] = alt
+                        prev_left[j] = id_left
+
+            id_min, dist_min = None, inf
+            for j in list_unscanned:
+                if dist[j] < dist_min:
+                    id_min, dist_min = j, dist[j]
+            if id_min == None or dist_min >= dist_sink:
+                break
+
+            list_unscanned.remove(id_min)
+            list_scanned.append(id_min)
+            id_left = match_right[id_min]
+            dist_left = dist_min
+            if id_left == None and dist_min + pot_right[id_min] < dist_sink:
+                id_sink, dist_sink = id_min, dist_min + pot_right[id_min]
+
+        if id_sink == None:
+            raise ValueError("left node %d cannot be matched" % id_left_root)
+
+        # keep matched edges and the new path tight, and the rest non-negative
+        pot_left[id_left_root] += dist_sink
+        for j in list_scanned:
+            delta = dist_sink - dist[j]
+            pot_right[j] -= delta
+            if match_right[j] != None:
+                pot_left[match_right[j]] += delta
+
+        # flip the path: new_match = match (exclusive or) path
+        id_right = id_sink
+        while True:
+            id_left = prev_left[id_right]
+            id_prev_right = self.map_match_left_to_right[id_left]
+            self.map_match_left_to_right[id_left] = \
+                self._global_node_id(id_right, False)
+            match_right[id_right] = id_left
+            if id_left == id_left_root:
+                break
+            id_right = self._local_node_id(id_prev_right)
+
+
+    def _release_right_node(self, id_right_root):
+        """restore the potentials after the right node id_right_root became
+           exposed with a negative potential, e.g. its matched edge was
+           removed. Then some matched right node might rather be exposed
+           while its left node moves along an alternating path to
+           id_right_root. The cheapest such path is found with dijkstra
+           starting from all matched right nodes at the cost of exposing them
+           (minus their potentials), and is flipped if it saves weight.
+           Either way the potentials are shifted so that id_right_root ends
+           with a non-negative potential or matched. O(mn) like an
+           augumentation.
+        """
+        table = self.table_weight
+        pot_left = self.potential_left
+        pot_right = self.potential_right
+        match_right = self.map_match_right_to_left
+        inf = float('inf')
+
+        # the path is only worth flipping if it costs less than this
+        dist_cap = -pot_right[id_right_root]
+        if dist_cap <= 0:
+            return
+
+        dist = [ (-pot_right[j] if match_right[j] != None else inf)
+                 for j in range(0, self.num_right) ]
+        prev_right = [None] * self.num_right
+        list_unscanned = range(0, self.num_right)
+        list_scanned = []
+        flag_flip = False
+
+        while True:
+            id_min, dist_min = None, inf
+            for j in list_unscanned:
+                if dist[j] < dist_min:
+                    id_min, dist_min = j, dist[j]
+            if id_min == None or dist_min >= dist_cap:
+                break
+
+            list_unscanned.remove(id_min)
+            list_scanned.append(id_min)
+            if id_min == id_right_root:
+                dist_cap, flag_flip = dist_min, True
+                break
+
+            id_left = match_right[id_min]
+            if id_left == None:
+                continue
+            row = table[id_left]
+            pot = pot_left[id_left]
+            for j in list_unscanned:
+                if row[j] == None:
+                    continue
+                alt = dist_min + row[j] - pot - pot_right[j]
+                if alt < dist[j]:
+                    dist[j] = alt
+                    prev_right[j] = id_min
+
+        # shift every potential by dist_cap, and the scanned ones by their
+        # distance instead
+        for i in range(0, self.num_left):
+            pot_left[i] -= dist_cap
+        for j in range(0, self.num_right):
+            pot_right[j] += dist_cap
+        for j in list_scanned:
+            delta = dist_cap - dist[j]
+            pot_right[j] -= delta
+            if match_right[j] != None:
+                pot_left[match_right[j]] += delta
+
+        if not flag_flip:
+            return
+
+        # flip the path: each left node on it moves to the next right node
+        id_right = id_right_root
+        while prev_right[id_right] != None:
+            id_prev_right = prev_right[id_right]
+            id_left = match_right[id_prev_right]
+            self.map_match_left_to_right[id_left] = \
+                self._global_node_id(id_right, False)
+            match_right[id_right] = id_left
+            id_right = id_prev_right
+        match_right[id_right] = None
+
+
+    def _find_match_heap(self):
+        """find match using heap based _find_min_augument_path(). This is the
+           original search on raw weights, kept only for comparison in the
+           tests. It is not guaranteed to find the minimum match once the
+           weights of right to left (matched) edges in the search go
+           negative, so use find_match()."""
 
         while True:
             aug_path = self._find_min_augument_path()
@@ -76,8 +722,8 @@ class MinWeightBipartiteMatch(object):
       
             # update map_match_right_left according to new
             # map_match_left_to_right
-            self.map_match_right_to_left = [None] * len(self.map_match_right_to_left)
-            for i in range( 0, len(self.map_match_right_to_left) ):
+            self.map_match_right_to_left = [None] * self.num_right
+            for i in range( 0, self.num_left ):
                 if (self.map_match_left_to_right[i] != None):
                   self.map_match_right_to_left[
                       self._local_node_id(self.map_match_left_to_right[i])] = i
@@ -141,8 +787,8 @@ class MinWeightBipartiteMatch(object):
            all the nodes but source nodes will be inserted into heap with
            appropriate weights and prev_nodes.
         """
-        min_weight_right_nodes = [sys.maxint] * len(self.table_weight)
-        prev_of_right_nodes = [None] * len(self.table_weight)
+        min_weight_right_nodes = [sys.maxint] * self.num_right
+        prev_of_right_nodes = [None] * self.num_right
 
         num_left_exposed_node = 0
 
@@ -152,8 +798,9 @@ class MinWeightBipartiteMatch(object):
                 num_left_exposed_node += 1
                 left_exposed_node = HeapNode( self._global_node_id(i, True), 0 )
 
-                for j in range( 0, len(self.table_weight) ):
-                    if min_weight_right_nodes[j] > self.table_weight[i][j]:
+                for j in range( 0, self.num_right ):
+                    if self.table_weight[i][j] != None and \
+                       min_weight_right_nodes[j] > self.table_weight[i][j]:
                         min_weight_right_nodes[j] = self.table_weight[i][j]
                         prev_of_right_nodes[j] = left_exposed_node
             else:
@@ -165,7 +812,7 @@ class MinWeightBipartiteMatch(object):
             heap = []
             return
 
-        for j in range(0, len(self.table_weight) ):
+        for j in range(0, self.num_right ):
             heappush( heap,
                       HeapNode( self._global_node_id(j, False),
                                 min_weight_right_nodes[j],
@@ -174,34 +821,37 @@ class MinWeightBipartiteMatch(object):
 
     def _global_node_id(self, local_id, flag_left_category):
         """return global id of the node given local id and category flag"""
-        assert local_id >= 0 and local_id < len(self.table_weight), \
+        assert local_id >= 0 and local_id < ( self.num_left
+                if flag_left_category else self.num_right ), \
                 "unexpected local_id: %d" % local_id
         return ( local_id if flag_left_category else
-                    len(self.table_weight) + local_id )
+                    self.num_left + local_id )
 
 
     def _local_node_id(self, global_id):
         """return local id given global id"""
-        assert global_id >= 0 and global_id < 2 * len(self.table_weight), \
+        assert global_id >= 0 and \
+                 global_id < self.num_left + self.num_right, \
                 "unexpected global_id: %d" % global_id
         return ( global_id if self._is_node_left_category(global_id) else
-                    global_id - len(self.table_weight) )
+                    global_id - self.num_left )
 
 
     def _is_node_left_category(self, global_id_node):
         """return true if the node is in left category, false otherwise"""
-        assert global_id_node >= 0 and global_id_node < 2 * len(self.table_weight), \
+        assert global_id_node >= 0 and \
+                 global_id_node < self.num_left + self.num_right, \
                 "unexpected global_id: %d" % global_id_node
-        return ( global_id_node < len(self.table_weight) )
+        return ( global_id_node < self.num_left )
 
     
     def _is_node_exposed_right_category(self, global_id_node):
         """return true if the node is exposed and in right category, false otherwise"""
         assert global_id_node >= 0 and \
-                 global_id_node < (len(self.table_weight) * 2), \
+                 global_id_node < self.num_left + self.num_right, \
                "unexpected global_id: %d" % global_id
         local_id_node = self._local_node_id(global_id_node)
-        return (global_id_node >= len(self.table_weight) and
+        return (global_id_node >= self.num_left and
                 self.map_match_right_to_left[local_id_node] == None);
 
   
@@ -209,17 +859,20 @@ class MinWeightBipartiteMatch(object):
         """return neighbors in alternate path."""
         
         assert global_id_node >= 0 and \
-                 global_id_node < ( len(self.table_weight) * 2 ), \
+                 global_id_node < self.num_left + self.num_right, \
                "unexpected global_id: %d" % global_id
         
         
         if self._is_node_left_category(global_id_node): # left category
+            row = self.table_weight[global_id_node]
             if self.map_match_left_to_right[global_id_node] == None: # exposed node
-                return self.list_all_node_ids_right_category
+                return [ x for x in self.list_all_node_ids_right_category
+                         if row[self._local_node_id(x)] != None ]
             else: # node with match
                 list = []
                 for global_id_right_node in self.list_all_node_ids_right_category:
-                    if global_id_right_node != \
+                    if row[self._local_node_id(global_id_right_node)] != None and \
+                       global_id_right_node != \
                         self.map_match_left_to_right[global_id_node] and \
                        heap.count( HeapNode(global_id_right_node, 0, None, False) ) > 0:
                         list.append(global_id_right_node)
@@ -240,6 +893,24 @@ class MinWeightBipartiteMatch(object):
 class TestMinWeightBipartiteMatch (unittest.TestCase):
     """Test MinWeightBipartiteMatch class."""
 
+    @staticmethod
+    def _get_random_table(rand, num_left, num_right):
+        """return random weight table with about 20% forbidden pairs"""
+        return [ [ (rand.randint(0, 20) if rand.random() > 0.2 else None)
+                   for j in range(0, num_right) ]
+                 for i in range(0, num_left) ]
+
+    @staticmethod
+    def _get_brute_force_weights(table):
+        """return sorted total weights of all matches of table"""
+        num_left = len(table)
+        list_weights = []
+        for perm in permutations(range(0, len(table[0])), num_left):
+            list_weight = [ table[i][perm[i]] for i in range(0, num_left) ]
+            if None not in list_weight:
+                list_weights.append(sum(list_weight))
+        return sorted(list_weights)
+
     def setUp(self):
         self.mwbm = MinWeightBipartiteMatch([[3,5.0,6],[5,8,6],[84,2,10]])
         self.mwbm.map_match_left_to_right[0] = self.mwbm._local_node_id(3)
@@ -312,6 +983,221 @@ class TestMinWeightBipartiteMatch (unittest.TestCase):
                          'find_match() fail. result = %s'
                          % (result) )
         
+    def test_05_find_match_rectangular(self):
+        """test find_match() with more right nodes than left nodes."""
+
+        mwbm = MinWeightBipartiteMatch([[4,1,3,7],[2,0,5,1],[3,2,2,9]])
+        result = mwbm.find_match()
+        self.failUnless (result == [1,3,2],
+                         'find_match() fail. result = %s'
+                         % (result) )
+
+        self.failUnless (mwbm._find_match_heap() == result,
+                         '_find_match_heap() fail. result = %s'
+                         % (mwbm.solution) )
+
+    def test_06_find_match_forbidden(self):
+        """test find_match() with forbidden pairs."""
+
+        mwbm = MinWeightBipartiteMatch([[3,None,6],[5,8,6],[84,None,10]])
+        result = mwbm.find_match()
+        self.failUnless (result == [0,1,2],
+                         'find_match() fail. result = %s'
+                         % (result) )
+
+        mwbm = MinWeightBipartiteMatch([[1,None],[2,None]])
+        self.assertRaises(ValueError, mwbm.find_match)
+
+    def test_07_find_match_brute_force(self):
+        """compare find_match() with brute force on random tables."""
+
+        rand = Random(11)
+        for num_left, num_right in [(3,3), (3,5), (4,6), (5,5), (1,4)]:
+            for trial in range(0, 10):
+                table = self._get_random_table(rand, num_left, num_right)
+                list_expected = self._get_brute_force_weights(table)
+
+                mwbm = MinWeightBipartiteMatch(table)
+                if len(list_expected) == 0:
+                    self.assertRaises(ValueError, mwbm.find_match)
+                    continue
+                result = mwbm.find_match()
+                total = mwbm._get_total_weight(table, result)
+                self.failUnless (total == list_expected[0],
+                                 'find_match(%s) fail. result = %s'
+                                 % (table, result) )
+        
+        
+    def test_08_find_k_best_match(self):
+        """compare find_k_best_match() with brute force on random tables."""
+
+        rand = Random(27)
+        for num_left, num_right in [(3,3), (3,5), (4,4), (4,6)]:
+            for trial in range(0, 5):
+                table = self._get_random_table(rand, num_left, num_right)
+                list_expected = self._get_brute_force_weights(table)
+
+                mwbm = MinWeightBipartiteMatch(table)
+                if len(list_expected) == 0:
+                    self.assertRaises(ValueError, mwbm.find_k_best_match, 5)
+                    continue
+                result = mwbm.find_k_best_match(10)
+                list_match = [ tuple(match) for weight, match in result ]
+                self.failUnless ([ weight for weight, match in result ] ==
+                                 list_expected[:10] and
+                                 len(set(list_match)) == len(list_match),
+                                 'find_k_best_match(%s) fail. result = %s'
+                                 % (table, result) )
+        
+    def test_09_get_sensitivity(self):
+        """compare get_sensitivity() with solving again on random tables."""
+
+        rand = Random(28)
+        for num_left, num_right in [(3,3), (3,5), (4,4), (4,6)]:
+            for trial in range(0, 5):
+                table = self._get_random_table(rand, num_left, num_right)
+                mwbm = MinWeightBipartiteMatch(table)
+                try:
+                    solution = mwbm.find_match()
+                except ValueError:
+                    continue
+                total = mwbm._get_total_weight(table, solution)
+                result = mwbm.get_sensitivity()
+
+                for i in range(0, num_left):
+                    increase, id_right_alt, weight_alt = result[i]
+
+                    # the match stays minimum within the increase
+                    if increase != float('inf'):
+                        table_more = [ list(row) for row in table ]
+                        table_more[i][solution[i]] += increase
+                        solution_more = \
+                            MinWeightBipartiteMatch(table_more).find_match()
+                        self.failUnless (
+                            mwbm._get_total_weight(table_more,
+                                                   solution_more) ==
+                            total + increase,
+                            'get_sensitivity() fail on %s. result = %s'
+                            % (table, result) )
+
+                    # matching the left node to id_right_alt costs more
+                    if id_right_alt != None:
+                        table_alt = [ list(row) for row in table ]
+                        table_alt[i] = [None] * num_right
+                        table_alt[i][id_right_alt] = table[i][id_right_alt]
+                        try:
+                            solution_alt = \
+                                MinWeightBipartiteMatch(table_alt).find_match()
+                        except ValueError:
+                            continue
+                        self.failUnless (
+                            mwbm._get_total_weight(table_alt, solution_alt) >=
+                            total + weight_alt,
+                            'get_sensitivity() fail on %s. result = %s'
+                            % (table, result) )
+        
+    def test_10_checkpoint(self):
+        """test save_checkpoint() and load_checkpoint() functions."""
+
+        rand = Random(29)
+        table = [ [ rand.randint(0, 50) for j in range(0, 8) ]
+                  for i in range(0, 6) ]
+        expected = MinWeightBipartiteMatch(table).find_match()
+        file_name = os.path.join(tempfile.mkdtemp(), "match.ckp")
+
+        # stop after a few augumentations, as if the process was killed
+        mwbm = MinWeightBipartiteMatch(table)
+        mwbm._init_potentials()
+        for i in range(0, 3):
+            mwbm._augment_with_potentials(i)
+        mwbm.save_checkpoint(file_name)
+
+        mwbm = MinWeightBipartiteMatch(table)
+        mwbm.load_checkpoint(file_name)
+        self.failUnless (mwbm.map_match_left_to_right[3:] == [None] * 3,
+                         'load_checkpoint() fail. result = %s'
+                         % (mwbm.map_match_left_to_right) )
+        result = mwbm.find_match()
+        self.failUnless (mwbm._get_total_weight(table, result) ==
+                         mwbm._get_total_weight(table, expected),
+                         'find_match() after load_checkpoint() fail. '
+                         'result = %s' % (result) )
+
+        # checkpoint every augumentation while solving
+        mwbm = MinWeightBipartiteMatch(table)
+        mwbm.set_checkpoint(file_name, 1)
+        result = mwbm.find_match()
+        mwbm = MinWeightBipartiteMatch(table)
+        mwbm.load_checkpoint(file_name)
+        self.failUnless (mwbm.find_match() == result,
+                         'set_checkpoint() fail. result = %s'
+                         % (mwbm.solution) )
+
+        # rename which does not replace an existing file, as on Windows
+        def rename_no_replace(src, dst):
+            if os.path.exists(dst):
+                raise OSError("file exists: %s" % dst)
+            rename(src, dst)
+        rename = os.rename
+        os.rename = rename_no_replace
+        try:
+            mwbm.save_checkpoint(file_name)
+            mwbm.save_checkpoint(file_name)
+        finally:
+            os.rename = rename
+        os.rename(file_name, file_name + ".tmp")
+        mwbm = MinWeightBipartiteMatch(table)
+        mwbm.load_checkpoint(file_name)
+        self.failUnless (mwbm.find_match() == result,
+                         'save_checkpoint() without replace fail. result = %s'
+                         % (mwbm.solution) )
+        os.rename(file_name + ".tmp", file_name)
+
+        # truncated and corrupted checkpoints
+        data = open(file_name, "rb").read()
+        open(file_name, "wb").write(data[:-4])
+        self.assertRaises(ValueError, mwbm.load_checkpoint, file_name)
+        list_potential_left = array('d', [-1000.0] * 6)
+        list_potential_right = array('d', [0.0] * 8)
+        open(file_name, "wb").write(data[:-14 * 8] +
+                                    list_potential_left.tostring() +
+                                    list_potential_right.tostring())
+        self.assertRaises(ValueError, mwbm.load_checkpoint, file_name)
+        open(file_name, "wb").write(data)
+
+        table[0][0] += 1
+        mwbm = MinWeightBipartiteMatch(table)
+        self.assertRaises(ValueError, mwbm.load_checkpoint, file_name)
+        os.remove(file_name)
+        os.rmdir(os.path.dirname(file_name))
+        
+    def test_11_add_left_node(self):
+        """test add_left_node() and match_left_node() functions."""
+
+        rand = Random(32)
+        table = [ [ rand.randint(0, 50) for j in range(0, 7) ]
+                  for i in range(0, 5) ]
+        mwbm = MinWeightBipartiteMatch([], 7)
+        mwbm.find_match()
+        for i in range(0, 5):
+            id_left = mwbm.add_left_node(table[i])
+            mwbm.match_left_node(id_left)
+            match = mwbm.get_match()
+            expected = MinWeightBipartiteMatch(table[:i + 1]).find_match()
+            self.failUnless (id_left == i and
+                             mwbm._get_total_weight(table, match) ==
+                             mwbm._get_total_weight(table, expected),
+                             'match_left_node(%d) fail. result = %s'
+                             % (i, match) )
+
+        mwbm = MinWeightBipartiteMatch([], 2)
+        mwbm.find_match()
+        mwbm.add_left_node([1, 2])
+        mwbm.add_left_node([2, 4])
+        self.failUnless (mwbm.find_match() == [1, 0],
+                         'find_match() after add_left_node() fail. '
+                         'result = %s' % (mwbm.solution) )
+        self.assertRaises(AssertionError, mwbm.add_left_node, [1, 1])
         
     def tearDown(self):
         pass
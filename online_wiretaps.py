@@ -0,0 +1,350 @@
+# OnlineWiretaps class
+
+import unittest
+from time import time
+from cStringIO import StringIO
+from min_weight_bipartite_match import MinWeightBipartiteMatch
+from cost_rules import PRODUCTION_RULES
+from wiretaps import Wiretaps
+
+__all__ = ['OnlineWiretaps']
+
+class OnlineWiretaps(object):
+    """Assigns victims to programmers as the victims arrive one by one.
+
+       A victim arriving is assigned at once to the free programmer with the
+       smallest cost minus dual price (the potential of the programmer in the
+       solver), and becomes pending. After every every_arrivals arrivals,
+       up to num_augmentations pending victims (the oldest first) are
+       settled: each is matched by one augumentation of the solver, which
+       keeps the settled victims optimally assigned and may move some of
+       them to other programmers. Pending victims whose programmer gets
+       taken are assigned again. A victim for whom every allowed programmer
+       is settled or promised to a pending victim is settled at once.
+
+       The potentials of the solver also give a lower bound of the offline
+       optimum of the victims so far, so the gap of the current assignment to
+       the offline optimum is at most get_total_cost() - get_lower_bound(),
+       and is 0 when no victim is pending.
+
+       list_forbidden_pairs has (victim name, programmer number) pairs
+       which are never assigned, as in Wiretaps.solve_problem().
+    """
+
+    def __init__(self, num_programmers, num_augmentations = 1,
+                 every_arrivals = 1, cost_rules = PRODUCTION_RULES,
+                 list_forbidden_pairs = None):
+        self.num_programmers = num_programmers
+        self.num_augmentations = num_augmentations
+        self.every_arrivals = every_arrivals
+        self.compiled_rules = cost_rules.compile(num_programmers)
+        self.dict_forbidden_progs = {}
+        for vname, id_prog in (list_forbidden_pairs or []):
+            assert id_prog >= 1 and id_prog <= num_programmers, \
+                   "unknown programmer: %s" % id_prog
+            self.dict_forbidden_progs.setdefault(vname, []).append(id_prog)
+        self.cost_table = []
+        self.list_vnames = []
+        self.mwb_match = MinWeightBipartiteMatch(self.cost_table,
+                                                 num_programmers)
+        self.mwb_match.find_match()
+
+        # programmer (local id) of each victim, settled or pending
+        self.solution = []
+        self.list_pending = []
+        self.map_pending_prog_to_victim = {}
+        self.num_arrivals = 0
+
+        # victims whose programmer changed since reoptimize() last returned
+        self.set_changed = set()
+
+    def add_victim(self, vname):
+        """assign the arriving victim to a programmer at once and return
+           the programmer (local id). Raises ValueError, and leaves the
+           state as it was, if the victims so far cannot all be assigned."""
+        if len(self.list_vnames) == self.num_programmers:
+            raise ValueError("more victims than programmers (%d)"
+                             % self.num_programmers)
+
+        row = self.compiled_rules.get_row(vname)
+        if vname in self.dict_forbidden_progs:
+            # rows are shared with other victims
+            row = list(row)
+            for id_prog in self.dict_forbidden_progs[vname]:
+                row[id_prog - 1] = None
+        id_victim = self.mwb_match.add_left_node(row)
+        self.list_vnames.append(vname)
+        self.solution.append(None)
+        if self._assign_pending(id_victim):
+            self.list_pending.append(id_victim)
+        else:
+            state = self._get_state()
+            try:
+                set_changed = self._settle(id_victim)
+            except ValueError:
+                self._set_state(state)
+                self.mwb_match.remove_last_left_node()
+                self.list_vnames.pop()
+                self.solution.pop()
+                raise
+            set_changed.discard(id_victim)
+            self.set_changed |= set_changed
+        self.num_arrivals += 1
+        return self.solution[id_victim]
+
+    def _assign_pending(self, id_victim):
+        """assign the pending victim to the free programmer with the smallest
+           cost minus dual price, and return false if every allowed
+           programmer is settled or promised to a pending victim. O(n)."""
+        row = self.cost_table[id_victim]
+        pot_right = self.mwb_match.potential_right
+        match_right = self.mwb_match.map_match_right_to_left
+
+        id_prog_min, price_min = None, None
+        for j in range(0, self.num_programmers):
+            if row[j] == None or match_right[j] != None or \
+               j in self.map_pending_prog_to_victim:
+                continue
+            if id_prog_min == None or row[j] - pot_right[j] < price_min:
+                id_prog_min, price_min = j, row[j] - pot_right[j]
+        if id_prog_min == None:
+            return False
+
+        self.solution[id_victim] = id_prog_min
+        self.map_pending_prog_to_victim[id_prog_min] = id_victim
+        return True
+
+    def _settle(self, id_victim):
+        """match the victim, which is not pending, in the solver and return
+           the victims whose programmer changed. Pending victims whose
+           programmer gets taken are assigned again, or settled too if no
+           programmer is left for them. Raises ValueError if a victim cannot
+           be matched; the state is then inconsistent and must be restored
+           by _set_state()."""
+        self.mwb_match.match_left_node(id_victim)
+
+        set_changed = set()
+        list_displaced = []
+        for i, id_prog in enumerate(self.mwb_match.get_match()):
+            if id_prog != None and id_prog != self.solution[i]:
+                self.solution[i] = id_prog
+                set_changed.add(i)
+
+                # the programmer was promised to a pending victim
+                id_pending = self.map_pending_prog_to_victim.pop(id_prog, None)
+                if id_pending != None:
+                    list_displaced.append(id_pending)
+
+        for id_pending in list_displaced:
+            set_changed.add(id_pending)
+            if not self._assign_pending(id_pending):
+                self.list_pending.remove(id_pending)
+                set_changed |= self._settle(id_pending)
+        return set_changed
+
+    def _get_state(self):
+        """return a copy of the assignment and of the match and potentials
+           of the solver. O(m + n)."""
+        mwbm = self.mwb_match
+        return (list(self.solution), list(self.list_pending),
+                dict(self.map_pending_prog_to_victim),
+                list(mwbm.map_match_left_to_right),
+                list(mwbm.map_match_right_to_left),
+                list(mwbm.potential_left), list(mwbm.potential_right))
+
+    def _set_state(self, state):
+        """restore the state returned by _get_state()"""
+        mwbm = self.mwb_match
+        (self.solution, self.list_pending, self.map_pending_prog_to_victim,
+         mwbm.map_match_left_to_right, mwbm.map_match_right_to_left,
+         mwbm.potential_left, mwbm.potential_right) = state
+        mwbm.solution = None
+
+    def reoptimize(self, num_augmentations = None):
+        """settle up to num_augmentations pending victims (all if None) and
+           return the victims whose programmer changed since the last call,
+           including those moved by add_victim(). Raises ValueError, and
+           leaves the state as it was before the failing settlement, if the
+           victims so far cannot all be assigned."""
+        while self.list_pending and \
+              (num_augmentations == None or num_augmentations > 0):
+            state = self._get_state()
+            try:
+                id_victim = self.list_pending.pop(0)
+                del self.map_pending_prog_to_victim[self.solution[id_victim]]
+                self.set_changed |= self._settle(id_victim)
+            except ValueError:
+                self._set_state(state)
+                raise
+            if num_augmentations != None:
+                num_augmentations -= 1
+
+        list_changed = sorted(self.set_changed)
+        self.set_changed = set()
+        return list_changed
+
+    def step(self):
+        """reoptimize if due after an arrival and return the victims whose
+           programmer changed since the last step"""
+        if self.num_arrivals % self.every_arrivals != 0:
+            return self.reoptimize(0)
+        return self.reoptimize(self.num_augmentations)
+
+    def get_cost(self, id_victim):
+        """get cost of the victim in the current assignment"""
+        return self.cost_table[id_victim][self.solution[id_victim]]
+
+    def get_total_cost(self):
+        """get total cost of the current assignment"""
+        return sum([ self.get_cost(i) for i in range(0, len(self.solution)) ])
+
+    def get_lower_bound(self):
+        """get lower bound of the offline optimum of the victims so far,
+           i.e. the objective of the dual potentials of the solver"""
+        return sum(self.mwb_match.potential_left) + \
+               sum(self.mwb_match.potential_right)
+
+    def get_gap(self):
+        """get upper bound of the gap of the current assignment to the
+           offline optimum"""
+        return self.get_total_cost() - self.get_lower_bound()
+
+    def run(self, infile, outfile, get_name):
+        """assign the victims read from infile one per line, and write each
+           assignment to outfile as soon as it is made, with its latency
+           and the current gap. get_name turns a line into a victim name
+           (empty to skip). Reassignments are written after the
+           reoptimization, and everything pending is settled at the end.
+        """
+        while True:
+            line = infile.readline()
+            if not line:
+                break
+            time_arrival = time()
+            vname = get_name(line)
+            if len(vname) == 0:
+                continue
+
+            id_prog = self.add_victim(vname)
+            latency = time() - time_arrival
+            outfile.write("%s => %s(%s) latency: %.6f s gap: %s\n"
+                          % (vname, id_prog + 1,
+                             self.get_cost(len(self.list_vnames) - 1),
+                             latency, self.get_gap()) )
+            outfile.flush()
+            self._write_reassignments(outfile, self.step())
+
+        self._write_reassignments(outfile, self.reoptimize())
+        outfile.write("total cost: %f gap: %s\n"
+                      % (self.get_total_cost(), self.get_gap()) )
+        outfile.flush()
+
+    def _write_reassignments(self, outfile, list_changed):
+        """write the victims whose programmer changed"""
+        if len(list_changed) == 0:
+            return
+        outfile.write("".join([ "%s => %s(%s) reassigned\n"
+                                % (self.list_vnames[i], self.solution[i] + 1,
+                                   self.get_cost(i))
+                                for i in list_changed ]) )
+        outfile.flush()
+
+
+
+# this part is for unit testing of OnlineWiretaps class
+class TestOnlineWiretaps (unittest.TestCase):
+    """Test OnlineWiretaps class."""
+
+    def setUp(self):
+        self.list_vnames = ['andromeda', 'barbara', 'cameron', 'dagmar',
+                            'ekaterina', 'flannery', 'gregory', 'hamilton',
+                            'isabella', 'jebediah']
+        self.offline = Wiretaps(12)
+        self.offline.solve_problem(self.list_vnames)
+
+    def test_01_add_victim(self):
+        """test add_victim and reoptimize functions."""
+
+        online = OnlineWiretaps(12, 1, 3)
+        for vname in self.list_vnames:
+            online.add_victim(vname)
+            online.step()
+            list_assigned = [ x for x in online.solution if x != None ]
+            self.failUnless (len(set(list_assigned)) == len(online.solution)
+                             and online.get_gap() >= 0,
+                             'add_victim(%s) fail. result = %s'
+                             % (vname, online.solution) )
+
+        online.reoptimize()
+        self.failUnless (online.get_total_cost() ==
+                         self.offline.get_total_cost() and
+                         online.get_gap() == 0,
+                         'reoptimize() fail. result = %s, %s'
+                         % (online.get_total_cost(), online.get_gap()) )
+
+    def test_02_run(self):
+        """test run function."""
+
+        online = OnlineWiretaps(12)
+        outfile = StringIO()
+        online.run(StringIO("\n".join(self.list_vnames) + "\n\n"), outfile,
+                   lambda line: line.strip())
+        result = outfile.getvalue().splitlines()
+        self.failUnless (len(result) >= len(self.list_vnames) + 1 and
+                         result[-1] == "total cost: %f gap: 0.0"
+                         % self.offline.get_total_cost(),
+                         'run() fail. result = %s' % (result) )
+
+    def test_03_forbidden_pairs(self):
+        """test add_victim function with forbidden pairs."""
+
+        list_forbidden_pairs = [('barbara', 1), ('barbara', 2), ('isabella', 3)]
+        online = OnlineWiretaps(12, list_forbidden_pairs = list_forbidden_pairs)
+        for vname in self.list_vnames:
+            online.add_victim(vname)
+            online.step()
+        online.reoptimize()
+
+        self.offline.solve_problem(self.list_vnames, list_forbidden_pairs)
+        self.failUnless (online.solution[1] not in (0, 1) and
+                         online.solution[8] != 2 and
+                         online.get_total_cost() ==
+                         self.offline.get_total_cost() and
+                         online.compiled_rules.get_row('barbara')[0] != None,
+                         'forbidden pairs fail. result = %s'
+                         % (online.solution) )
+
+    def test_04_no_free_programmer(self):
+        """test add_victim function when every allowed programmer is
+           promised to a pending victim."""
+
+        online = OnlineWiretaps(2, 1, 5, list_forbidden_pairs = [('bob', 1)])
+        online.add_victim('ann')
+        result = online.add_victim('bob')
+        list_changed = online.step()
+        online.reoptimize()
+        offline = Wiretaps(2)
+        offline.solve_problem(['ann', 'bob'], [('bob', 1)])
+        self.failUnless (result == 1 and list_changed == [0] and
+                         online.solution == offline.solution == [0, 1],
+                         'add_victim() fail. result = %s' % (online.solution) )
+
+        # no assignment of both victims: the state is kept
+        online = OnlineWiretaps(2, 1, 5, list_forbidden_pairs =
+                                [('ann', 1), ('bob', 1)])
+        online.add_victim('ann')
+        self.assertRaises(ValueError, online.add_victim, 'bob')
+        self.failUnless (online.solution == [1] and
+                         online.list_pending == [0] and
+                         online.mwb_match.num_left == 1,
+                         'add_victim() fail. result = %s' % (online.solution) )
+        online.reoptimize()
+        self.failUnless (online.get_total_cost() == 4.5 and
+                         online.get_gap() == 0,
+                         'reoptimize() fail. result = %s' % (online.solution) )
+
+    def tearDown(self):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
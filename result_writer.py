@@ -0,0 +1,231 @@
+# ResultWriter class
+
+import unittest
+import csv
+import json
+import struct
+from array import array
+from itertools import izip
+from cStringIO import StringIO
+from json.encoder import encode_basestring_ascii
+
+__all__ = ['ResultWriter', 'FORMATS', 'BINARY_MAGIC']
+
+FORMATS = ['text', 'csv', 'jsonl', 'binary']
+BINARY_MAGIC = "WTAPSOL1"
+
+# characters which encode_basestring_ascii() does not escape
+JSON_SAFE_CHARS = "".join([ chr(x) for x in range(0x20, 0x7f)
+                            if chr(x) not in '"\\' ])
+
+class ResultWriter(object):
+    """ResultWriter streams a solution, i.e. the programmer and the cost of
+       each victim, to a file in one of the following formats:
+        - text:   the format of Wiretaps.print_solution()
+        - csv:    victim,programmer,cost with a header line
+        - jsonl:  {"victim": ..., "programmer": ..., "cost": ...} per line
+        - binary: BINARY_MAGIC, the number of victims as int32, programmer
+                  numbers as int32 and costs as float64 (native byte order).
+                  Victim names are not written; they are in input order.
+
+       Rows are formatted num_rows_chunk at a time into one string, so the
+       file gets a few large writes instead of one write per victim.
+    """
+
+    def __init__(self, outfile, format = 'text', num_rows_chunk = 65536):
+        assert format in FORMATS, "unknown format: %s" % format
+        self.outfile = outfile
+        self.format = format
+        self.num_rows_chunk = num_rows_chunk
+
+    def write_solution(self, list_vnames, list_prog_ids, list_costs,
+                       total_cost):
+        """write the solution. list_prog_ids are programmer numbers (from 1)
+           and list_costs the cost of each victim."""
+        assert len(list_vnames) == len(list_prog_ids) == len(list_costs), \
+               "solution and victims do not match"
+
+        if self.format == 'binary':
+            self._write_binary(list_prog_ids, list_costs)
+            return
+
+        if self.format == 'text':
+            self.outfile.write("total cost: %f\n\n" % total_cost)
+        elif self.format == 'csv':
+            self.outfile.write("victim,programmer,cost\r\n")
+
+        for start in range(0, len(list_vnames), self.num_rows_chunk):
+            end = start + self.num_rows_chunk
+            self._write_rows(list_vnames[start:end], list_prog_ids[start:end],
+                             list_costs[start:end])
+
+    @staticmethod
+    def _format_costs(list_costs):
+        """return the costs as strings: floats by repr() so they read back
+           exactly, integers and longs by str(). Costs take few distinct
+           values (half integers in production), so each distinct value is
+           formatted once and the rest is a dict lookup."""
+        dict_strs = {}
+        for cost in set(list_costs):
+            if isinstance(cost, float):
+                dict_strs[cost] = repr(cost)
+            else:
+                dict_strs[cost] = str(cost)
+        return map(dict_strs.__getitem__, list_costs)
+
+    def _write_rows(self, list_vnames, list_prog_ids, list_costs):
+        """write a chunk of rows in the text based formats. Rows are
+           formatted by map() over the format string so that the loop runs
+           in C."""
+
+        if self.format == 'text':
+            rows = izip(list_vnames, list_prog_ids, list_costs)
+            self.outfile.write( "".join(map("%s => %s(%s)\n".__mod__, rows)) )
+            return
+
+        list_ids = map(str, list_prog_ids)
+        list_costs = self._format_costs(list_costs)
+        names = "".join(list_vnames)
+        if self.format == 'csv':
+            if '"' in names or ',' in names or '\n' in names or '\r' in names:
+                buf = StringIO()
+                csv.writer(buf).writerows(
+                    izip(list_vnames, list_ids, list_costs) )
+                self.outfile.write(buf.getvalue())
+            else: # nothing to quote
+                self.outfile.write( self._join_rows(
+                    [list_vnames, list_ids, list_costs],
+                    ["", ",", ",", "\r\n"]) )
+        else:
+            if isinstance(names, str) and \
+               len(names.translate(None, JSON_SAFE_CHARS)) == 0:
+                quote = '"' # nothing to escape
+            else:
+                list_vnames = map(encode_basestring_ascii, list_vnames)
+                quote = ''
+            self.outfile.write( self._join_rows(
+                [list_vnames, list_ids, list_costs],
+                ['{"victim": ' + quote, quote + ', "programmer": ',
+                 ', "cost": ', '}\n']) )
+
+    @staticmethod
+    def _join_rows(list_fields, list_seps):
+        """return the rows of list_fields (one list per field) as one
+           string, where list_seps[k] comes before field k and
+           list_seps[-1] ends each row. The fields and separators are
+           interleaved by slice assignment and joined once, which is about
+           twice as fast as formatting each row."""
+        num_rows = len(list_fields[0])
+        stride = len(list_fields) + len(list_seps)
+        parts = [None] * (stride * num_rows)
+        for k in range(0, len(list_seps)):
+            parts[2 * k::stride] = [list_seps[k]] * num_rows
+        for k in range(0, len(list_fields)):
+            parts[2 * k + 1::stride] = list_fields[k]
+        return "".join(parts)
+
+    def _write_binary(self, list_prog_ids, list_costs):
+        """write the solution in the binary format"""
+
+        self.outfile.write(BINARY_MAGIC)
+        self.outfile.write(struct.pack('i', len(list_prog_ids)))
+        self.outfile.write(array('i', list_prog_ids).tostring())
+        self.outfile.write(array('d', list_costs).tostring())
+
+    @staticmethod
+    def read_binary(infile):
+        """return (list_prog_ids, list_costs) written in the binary format"""
+
+        assert infile.read(len(BINARY_MAGIC)) == BINARY_MAGIC, \
+               "not a binary solution"
+        num_rows = struct.unpack('i', infile.read(struct.calcsize('i')))[0]
+        list_prog_ids, list_costs = array('i'), array('d')
+        list_prog_ids.fromstring(infile.read(num_rows * list_prog_ids.itemsize))
+        list_costs.fromstring(infile.read(num_rows * list_costs.itemsize))
+        return (list_prog_ids.tolist(), list_costs.tolist())
+
+
+
+# this part is for unit testing of ResultWriter class
+class TestResultWriter (unittest.TestCase):
+    """Test ResultWriter class."""
+
+    def setUp(self):
+        self.list_vnames = ['john', 'kelly', 'bob']
+        self.list_prog_ids = [1, 2, 3]
+        self.list_costs = [7, 6.5, 5]
+
+    def _write(self, format):
+        outfile = StringIO()
+        writer = ResultWriter(outfile, format, 2)
+        writer.write_solution(self.list_vnames, self.list_prog_ids,
+                              self.list_costs, 18.5)
+        return outfile.getvalue()
+
+    def test_01_text(self):
+        """test text format."""
+
+        result = self._write('text')
+        expected = "total cost: 18.500000\n\n" \
+                   "john => 1(7)\nkelly => 2(6.5)\nbob => 3(5)\n"
+        self.failUnless (result == expected,
+                         'text format fail. result = %r' % (result) )
+
+    def test_02_csv(self):
+        """test csv format."""
+
+        result = list(csv.reader(StringIO(self._write('csv'))))
+        self.failUnless (result == [['victim', 'programmer', 'cost'],
+                                    ['john', '1', '7'],
+                                    ['kelly', '2', '6.5'],
+                                    ['bob', '3', '5']],
+                         'csv format fail. result = %s' % (result) )
+
+        self.list_vnames[1] = 'kelly, "jr"'
+        result = list(csv.reader(StringIO(self._write('csv'))))
+        self.failUnless (result[2] == ['kelly, "jr"', '2', '6.5'],
+                         'csv format fail. result = %s' % (result) )
+
+    def test_03_jsonl(self):
+        """test jsonl format."""
+
+        result = [ json.loads(line)
+                   for line in self._write('jsonl').splitlines() ]
+        self.failUnless (result == [
+                            {'victim': 'john', 'programmer': 1, 'cost': 7},
+                            {'victim': 'kelly', 'programmer': 2, 'cost': 6.5},
+                            {'victim': 'bob', 'programmer': 3, 'cost': 5}],
+                         'jsonl format fail. result = %s' % (result) )
+
+        self.list_vnames[2] = 'bob "\\b\t"'
+        result = [ json.loads(line)
+                   for line in self._write('jsonl').splitlines() ]
+        self.failUnless (result[2]['victim'] == u'bob "\\b\t"',
+                         'jsonl format fail. result = %s' % (result) )
+
+    def test_04_format_costs(self):
+        """test cost formatting of csv and jsonl formats."""
+
+        result = ResultWriter._format_costs([7L, 6.5, 0.1 + 0.2, 6.5, 2 ** 70])
+        self.failUnless (result == ['7', '6.5', repr(0.1 + 0.2), '6.5',
+                                    str(2 ** 70)],
+                         '_format_costs() fail. result = %s' % (result) )
+
+        self.list_costs[0] = 7L
+        result = [ json.loads(line)['cost']
+                   for line in self._write('jsonl').splitlines() ]
+        self.failUnless (result == [7, 6.5, 5],
+                         'jsonl format fail. result = %s' % (result) )
+
+    def test_05_binary(self):
+        """test binary format."""
+
+        result = ResultWriter.read_binary(StringIO(self._write('binary')))
+        self.failUnless (result == (self.list_prog_ids, self.list_costs),
+                         'binary format fail. result = %s' % (result,) )
+
+    def tearDown(self):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
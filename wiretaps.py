@@ -3,12 +3,9 @@
 import sys
 import getopt
 import unittest
-from prime_handler import PrimeHandler
 from min_weight_bipartite_match import MinWeightBipartiteMatch
-
-vowels = ['a', 'i', 'u', 'e', 'o']
-consonants = ['b', 'c', 'd', 'f', 'g', 'h', 'j', 'k', 'l', 'm', 'n', 'p', 'q',
-              'r', 's', 't', 'v', 'w', 'x', 'y', 'z']
+from cost_rules import PRODUCTION_RULES
+from result_writer import ResultWriter
 
 __all__ = ['Wiretaps','solve_problem','get_total_cost',
            'print_solution']
@@ -18,89 +15,185 @@ class Wiretaps(object):
        the total time necessary to crack all the wiretaps. The detail can be
        found at: http://www.facebook.com/jobs_puzzles/index.php?puzzle_id=11"""
 
-    def __init__(self):
-        self.phand = PrimeHandler()
+    def __init__(self, arg_num_programmers = None,
+                 arg_cost_rules = PRODUCTION_RULES):
+        """arg_num_programmers is the number of programmers. If it is None,
+           the number of programmers is the same as the number of victims.
+           arg_cost_rules is the CostRules of the problem."""
+        self.num_programmers = arg_num_programmers
+        self.cost_rules = arg_cost_rules
+        self.compiled_rules = None
         self.cost_table = None
         self.list_vnames = []
+        self.mwb_match = None
         self.solution = None
+        self.list_costs = None
+        self.total_cost = None
+        self.list_k_best = None
+        self.checkpoint = None
+
+    def get_num_programmers(self):
+        """return the number of programmers of the current problem"""
+        if self.num_programmers != None:
+            return self.num_programmers
+        return len(self.list_vnames)
 
     def _set_cost_table(self, list_victim_names):
-        """set cost table based on list of victim names"""
+        """set cost table based on list of victim names. The table has one
+           row per victim and one column per programmer. Victims with the
+           same key in the compiled rules share the same row."""
         
         self.list_vnames = list_victim_names
-        num_victim = len(list_victim_names)
-        self.cost_table = []
-        for vname in list_victim_names:
-            len_vname = len(vname)
-            num_vow   = Wiretaps._get_num_vowel(vname)
-            num_cons  = Wiretaps._get_num_consonant(vname)
-
-            even_weight = 1.5 * num_vow
-            odd_weight  = num_cons
-
-            row = []
-            flag_even_prog_id = False
-            for id_prog in range(1, num_victim + 1):
-                if flag_even_prog_id:
-                    weight = even_weight
-                else:
-                    weight = odd_weight
-                weight += ( len_vname + 2 *
-                    self.phand.num_shared_prime_factor(id_prog, len_vname) )
-                flag_even_prog_id = not flag_even_prog_id
-                row.append(weight)
-            self.cost_table.append(row)
-
-    @staticmethod
-    def _get_num_vowel(word):
-        """Return the number of vowel in input string. Assume the input string
-           contains lower case characters and does not contain any non-alphabet"""
-        counter = 0
-        for letter in word:
-            if vowels.count(letter) > 0:
-                counter += 1
-        return counter
-
-    @staticmethod
-    def _get_num_consonant(word):
-        """Return the number of consonant in input string. Assume the input
-           string contains lower case characters and does not contain any
-           non-alphabet"""
-        counter = 0
-        for letter in word:
-            if consonants.count(letter) > 0:
-                counter += 1
-        return counter
+        num_prog = self.get_num_programmers()
+        assert len(list_victim_names) <= num_prog, \
+               "more victims (%d) than programmers (%d)" \
+               % (len(list_victim_names), num_prog)
+        if self.compiled_rules == None or \
+           self.compiled_rules.num_programmers != num_prog:
+            self.compiled_rules = self.cost_rules.compile(num_prog)
+        self.cost_table = self.compiled_rules.build_cost_table(list_victim_names)
 
     
-    def solve_problem(self, list_victim_name):
-        """solve a wiretaps problem"""
+    def _set_forbidden_pairs(self, list_forbidden_pairs):
+        """remove pairs of (victim name, programmer number) from cost table.
+           A forbidden pair applies to every victim with the name."""
+
+        for vname, id_prog in list_forbidden_pairs:
+            assert id_prog >= 1 and id_prog <= self.get_num_programmers(), \
+                   "unknown programmer: %s" % id_prog
+            for i in range( 0, len(self.list_vnames) ):
+                if self.list_vnames[i] == vname:
+                    # rows may be shared with other victims
+                    self.cost_table[i] = list(self.cost_table[i])
+                    self.cost_table[i][id_prog - 1] = None
+
+    
+    def set_checkpoint(self, file_name, num_augmentations = None,
+                       num_seconds = None):
+        """make solve_problem() save the state of the solver to file_name
+           every num_augmentations assignments and/or every num_seconds
+           seconds."""
+        self.checkpoint = (file_name, num_augmentations, num_seconds)
+
+    
+    def solve_problem(self, list_victim_name, list_forbidden_pairs = None,
+                      resume_file_name = None):
+        """solve a wiretaps problem. list_forbidden_pairs is a list of
+           (victim name, programmer number) which must not be assigned.
+           If resume_file_name is given, the solver continues from the
+           checkpoint, which must be saved for the same problem."""
 
         self._set_cost_table(list_victim_name)
-        mwb_match = MinWeightBipartiteMatch(self.cost_table)
-        self.solution = mwb_match.find_match()
+        if list_forbidden_pairs:
+            self._set_forbidden_pairs(list_forbidden_pairs)
+        self.mwb_match = MinWeightBipartiteMatch(self.cost_table)
+        if self.checkpoint != None:
+            self.mwb_match.set_checkpoint(*self.checkpoint)
+        if resume_file_name != None:
+            self.mwb_match.load_checkpoint(resume_file_name)
+        self.solution = self.mwb_match.find_match()
+        self.list_costs = None
         return self.solution
 
     
+    def solve_k_best(self, list_victim_name, k, list_forbidden_pairs = None):
+        """solve a wiretaps problem and return the k best solutions as a list
+           of (total cost, solution) in increasing order of total cost. The
+           best one becomes the solution."""
+        assert k >= 1, "k must be at least 1"
+
+        self._set_cost_table(list_victim_name)
+        if list_forbidden_pairs:
+            self._set_forbidden_pairs(list_forbidden_pairs)
+        self.mwb_match = MinWeightBipartiteMatch(self.cost_table)
+        self.list_k_best = self.mwb_match.find_k_best_match(k)
+        self.solution = self.list_k_best[0][1]
+        self.list_costs = None
+        return self.list_k_best
+
+    
+    def get_costs(self):
+        """get cost of each victim in the solution"""
+        assert self.solution != None, "solve_problem() not called yet."
+
+        if self.list_costs == None:
+            self.list_costs = [ self.cost_table[i][self.solution[i]]
+                                for i in range( 0, len(self.solution) ) ]
+            self.total_cost = sum(self.list_costs)
+        return self.list_costs
+
     def get_total_cost(self):
         """get total cost of the solution"""
-        assert self.solution != None, "solve_problem() not called yet."
-        
-        total_cost = 0
-        for i in range( 0, len(self.solution) ):
-            total_cost += self.cost_table[i][self.solution[i]]
-        return total_cost
+        self.get_costs()
+        return self.total_cost
+
 
+    def write_solution(self, outfile, format = 'text'):
+        """write the solution to outfile in one of result_writer.FORMATS"""
+
+        writer = ResultWriter(outfile, format)
+        writer.write_solution(self.list_vnames,
+                              [ x + 1 for x in self.solution ],
+                              self.get_costs(), self.get_total_cost())
 
     def print_solution(self):
         """print the solution"""
+        self.write_solution(sys.stdout)
+
+    def sensitivity(self):
+        """return a sensitivity report of the solution computed from the
+           dual potentials of the solver, without solving again. The report
+           has (victim name, programmer, cost, safe cost, alternative
+           programmer, extra cost) for each victim. Both are bounds, not
+           exact values: the solution stays optimal while the cost of the
+           assignment is at most safe cost (it may stay optimal beyond),
+           and assigning the victim to the alternative programmer (None if
+           there is none) instead costs at least extra cost more than the
+           solution (it may cost more)."""
         assert self.solution != None, "solve_problem() not called yet."
-        
-        print "total cost: %f\n" % self.get_total_cost()
-        
+
+        list_report = []
+        list_sensitivity = self.mwb_match.get_sensitivity()
         for i in range( 0, len(self.solution) ):
-            print "%s => %s(%s)" % (self.list_vnames[i], self.solution[i] + 1, \
-                                    self.cost_table[i][self.solution[i]])
+            increase, id_alt, extra_cost = list_sensitivity[i]
+            cost = self.cost_table[i][self.solution[i]]
+            list_report.append( (self.list_vnames[i], self.solution[i] + 1,
+                                 cost, cost + increase,
+                                 (id_alt + 1 if id_alt != None else None),
+                                 extra_cost) )
+        return list_report
+
+    def write_sensitivity(self, outfile):
+        """write the sensitivity report to outfile as text"""
+
+        for vname, id_prog, cost, safe_cost, id_alt, extra_cost in \
+                self.sensitivity():
+            outfile.write("%s => %s(%s) safe up to: %s "
+                          "alternative: %s(extra cost >= %s)\n"
+                          % (vname, id_prog, cost, safe_cost, id_alt,
+                             extra_cost) )
+
+    def print_sensitivity(self):
+        """print the sensitivity report"""
+        self.write_sensitivity(sys.stdout)
+
+    def write_k_best(self, outfile):
+        """write the k best solutions to outfile as text"""
+        assert self.list_k_best != None, "solve_k_best() not called yet."
+
+        for rank in range( 0, len(self.list_k_best) ):
+            total_cost, solution = self.list_k_best[rank]
+            outfile.write("#%d total cost: %f\n\n" % (rank + 1, total_cost))
+
+            for i in range( 0, len(solution) ):
+                outfile.write("%s => %s(%s)\n"
+                              % (self.list_vnames[i], solution[i] + 1,
+                                 self.cost_table[i][solution[i]]) )
+            outfile.write("\n")
+
+    def print_k_best(self):
+        """print the k best solutions"""
+        self.write_k_best(sys.stdout)
 
     def print_cost_table(self):
         assert self.cost_table != None, "cost table not constructed yet."
@@ -122,48 +215,40 @@ class TestWiretaps (unittest.TestCase):
     def setUp(self):
         self.wiretaps = Wiretaps()
 
-    def test_01_get_num_vowel(self):
-        """test get_num_vowel function."""
-        result = Wiretaps.get_num_vowel("chair")
-        self.failUnless (result == 2,
-                         'get_num_vowel("chair") fail. result = %s'
-                         % (result) )
+    def test_01_get_letter_counts(self):
+        """test letter counts of the production rules."""
+        result = PRODUCTION_RULES.get_letter_counts("chair")
+        self.failUnless (result == (3, 2),
+                         'get_letter_counts("chair") fail. result = %s'
+                         % (result,) )
 
-        result = Wiretaps.get_num_vowel("box")
-        self.failUnless (result == 1,
-                         'get_num_vowel(" box ") fail. result = %s'
-                         % (result) )
+        result = PRODUCTION_RULES.get_letter_counts("box")
+        self.failUnless (result == (2, 1),
+                         'get_letter_counts("box") fail. result = %s'
+                         % (result,) )
 
-    def test_02_get_num_consonant(self):
-        """test get_num_consonant function."""
-        result = Wiretaps.get_num_consonant("chair")
-        self.failUnless (result == 3,
-                         'get_num_consonant("chair") fail. result = %s'
-                         % (result) )
+    def test_02_set_cost_table_primes(self):
+        """test set_cost_table function with long names."""
 
-        result = Wiretaps.get_num_consonant("box")
-        self.failUnless (result == 2,
-                         'get_num_consonant(" box ") fail. result = %s'
-                         % (result) )
+        wiretaps = Wiretaps(60)
+        wiretaps._set_cost_table(['b' * 53, 'b' * 49])
+        result = (wiretaps.cost_table[0][52], wiretaps.cost_table[1][48])
+        self.failUnless (result == (108, 100),
+                         "set_cost_table(['b' * 53, 'b' * 49]) fail. "
+                         "result = %s" % (result,) )
 
     def test_03_set_cost_table(self):
         """test set_cost_table function."""
 
         self.wiretaps._set_cost_table(['john'])
-        self.failUnless (self.wiretaps.cost_table ==
-                         [[4 + Wiretaps.get_num_consonant('john') + 0]],
+        self.failUnless (self.wiretaps.cost_table == [[4 + 3 + 0]],
                          "set_cost_table(['john'] fail. result = %s"
                          % (self.wiretaps.cost_table) )
 
 
         self.wiretaps._set_cost_table(['john', 'kelly'])
-        expected = [[4 + Wiretaps.get_num_consonant('john') + 0,
-                     4 + 1.5 * Wiretaps.get_num_vowel('john') +
-                     2 * self.wiretaps.phand.num_shared_prime_factor(2,4)],
-                    [5 + Wiretaps.get_num_consonant('kelly') + 0,
-                     5 + 1.5 * Wiretaps.get_num_vowel('kelly') +
-                     2 * self.wiretaps.phand.num_shared_prime_factor(2,5)]
-                    ]
+        expected = [[4 + 3 + 0, 4 + 1.5 * 1 + 2 * 1],
+                    [5 + 4 + 0, 5 + 1.5 * 1 + 2 * 0]]
         self.failUnless (self.wiretaps.cost_table == expected,
                          "set_cost_table(['john'] fail. result = %s \nexpected = %s"
                          % (self.wiretaps.cost_table, expected) )
@@ -175,6 +260,43 @@ class TestWiretaps (unittest.TestCase):
         self.failUnless (result == [0,1],
                          "solve_problem(['john','kelly'] fail. result = %s"
                          % (result) )
+
+    def test_05_solve_problem_more_programmers(self):
+        """test solve_problem function with more programmers than victims
+           and forbidden pairs."""
+
+        wiretaps = Wiretaps(4)
+        result = wiretaps.solve_problem(['john','kelly'])
+        self.failUnless (wiretaps.get_num_programmers() == 4 and
+                         len(wiretaps.cost_table[0]) == 4 and
+                         result == [0,1],
+                         "solve_problem(['john','kelly'] fail. result = %s"
+                         % (result) )
+
+        result = wiretaps.solve_problem(['john','kelly'], [('john', 1)])
+        self.failUnless (result[0] == 2 and wiretaps.get_total_cost() == 13.5,
+                         "solve_problem(['john','kelly'] fail. result = %s"
+                         % (result) )
+        
+    def test_06_solve_k_best(self):
+        """test solve_k_best function."""
+
+        result = self.wiretaps.solve_k_best(['john','kelly','bob'], 10)
+        list_cost = [ total_cost for total_cost, solution in result ]
+        self.failUnless (len(result) == 6 and list_cost == sorted(list_cost)
+                         and self.wiretaps.solution == result[0][1]
+                         and self.wiretaps.get_total_cost() == list_cost[0],
+                         "solve_k_best(['john','kelly','bob'], 10) fail. "
+                         "result = %s" % (result) )
+        
+    def test_07_sensitivity(self):
+        """test sensitivity function."""
+
+        self.wiretaps.solve_problem(['john','kelly'])
+        result = self.wiretaps.sensitivity()
+        self.failUnless (result == [('john', 1, 7, 7.5, 2, 0.5),
+                                    ('kelly', 2, 6.5, 9.0, 1, 2.5)],
+                         "sensitivity() fail. result = %s" % (result) )
         
     def tearDown(self):
         pass